@@ -54,8 +54,7 @@ CREATE TABLE IF NOT EXISTS users (
     FOREIGN KEY (customer_id) REFERENCES corporate_customers(id) ON DELETE CASCADE,
     FOREIGN KEY (role_id) REFERENCES user_roles(id) ON DELETE RESTRICT,
     INDEX idx_customer_id (customer_id),
-    INDEX idx_role_id (role_id),
-    INDEX idx_email (email)
+    INDEX idx_role_id (role_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Customer relationship touchpoints table
@@ -9,8 +9,8 @@ The published event follows the CloudEvent 1.0 specification with the following
 - specversion: "1.0"
 - type: "disco.knapscen.user.saved"
 - source: "knapscen.disco"
-- subject: "user-saved-{USER_ID}-{CUSTOMER_NAME}"
-- id: "evt-user-{TIMESTAMP}"
+- subject: "user-{USER_ID}"
+- id: first 8 hex characters of a random UUID
 - time: ISO 8601 timestamp
 - datacontenttype: "application/json"
 - data: User information payload
@@ -18,7 +18,7 @@ The published event follows the CloudEvent 1.0 specification with the following
 Required Environment Variables:
 - USER_NAME: Full name of the user
 - USER_EMAIL: Email address of the user
-- CUSTOMER_NAME: Name of the corporate customer (will lookup ID)
+- CUSTOMER_ID: UUID of the corporate customer (or use CUSTOMER_NAME to lookup)
 - ROLE_ID: UUID of the role (or use ROLE_NAME to lookup)
 
 Database Connection (required):
@@ -35,44 +35,78 @@ NATS Connection (required):
 - NATS_USER: NATS username
 - NATS_PASSWORD: NATS password
 
+Optional:
+- LOG_LEVEL: Logging level (default: INFO)
+- USERS_FILE: Path to a JSON Lines file of users to register in bulk, replacing
+  the single-user variables above. Each line is an object with user_name,
+  user_email, customer_id or customer_name, and role_id or role_name.
+
 Optional lookup variables (use instead of IDs):
 - CUSTOMER_NAME: Name of the corporate customer (will lookup ID)
 - ROLE_NAME: Name of the role (will lookup ID)
+
+The event's data.customer_name and data.user_role are taken from CUSTOMER_NAME
+and ROLE_NAME only, so set them alongside CUSTOMER_ID/ROLE_ID for a complete event.
 """
 
 import os
 import sys
-import json
 import logging
 import asyncio
 import uuid
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterable, List, NamedTuple, Tuple
 from dataclasses import dataclass
+from functools import lru_cache
 
-import pymysql
+import msgspec
+import aiomysql
 import nats
 from nats.js import JetStreamContext
 
 
-# Configure logging
+# Environment is fixed for the lifetime of the process, so snapshot it once
+_ENV = dict(os.environ)
+
+# Configure logging (LOG_LEVEL=WARNING silences per-user progress messages)
+_log_level_name = _ENV.get('LOG_LEVEL', 'INFO').upper()
+_log_level = logging.getLevelName(_log_level_name)
 logging.basicConfig(
-    level=logging.INFO,
+    level=_log_level if isinstance(_log_level, int) else logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+if not isinstance(_log_level, int):
+    logger.warning("Unknown LOG_LEVEL %r, defaulting to INFO", _log_level_name)
 
+# User-related environment variables included in event data, paired with their event keys
+_USER_VARS_LOWER = [
+    (var, var.lower())
+    for var in ('USER_NAME', 'USER_EMAIL', 'CUSTOMER_NAME', 'ROLE_ID', 'ROLE_NAME')
+]
 
-@dataclass
-class UserInfo:
-    """Data class for user information"""
-    name: str
-    email: str
+# Name -> ID caches for customer and role lookups, kept for the process lifetime.
+# Keys are casefolded (see name_key) to match the case-insensitive column collation.
+_customer_id_cache: Dict[str, str] = {}
+_role_id_cache: Dict[str, str] = {}
+
+# JSON encoder for event payloads, reused across publishes
+_event_encoder = msgspec.json.Encoder()
+
+# Persistent NATS connection and JetStream context, reused across publishes
+_nc: Optional[nats.NATS] = None
+_js: Optional[JetStreamContext] = None
+
+
+class UserInfo(NamedTuple):
+    """Named tuple for user information, fields ordered to match the users INSERT columns"""
     customer_id: str
     role_id: str
+    name: str
+    email: str
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class DatabaseConfig:
     """Data class for database configuration"""
     host: str
@@ -82,7 +116,7 @@ class DatabaseConfig:
     database: str
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class NATSConfig:
     """Data class for NATS configuration"""
     server: str
@@ -91,6 +125,42 @@ class NATSConfig:
     user: str
     password: str
 
+
+# Rows per multi-row INSERT in bulk mode, keeps statements under max_allowed_packet
+BULK_INSERT_CHUNK_SIZE = 1000
+
+# Most JetStream publishes awaiting an ack at once in bulk mode
+PUBLISH_CONCURRENCY = 100
+
+# SQL statements, built once at import rather than per call
+INSERT_USER_QUERY = "INSERT INTO users (id, customer_id, role_id, name, email) VALUES "
+INSERT_USER_ROW = "(%s, %s, %s, %s, %s)"
+LOOKUP_CUSTOMER_QUERY = "SELECT 'c' AS kind, name, id FROM corporate_customers WHERE name IN ({})"
+LOOKUP_ROLE_QUERY = "SELECT 'r' AS kind, role_name, id FROM user_roles WHERE role_name IN ({})"
+
+
+class UserSavedData(msgspec.Struct, kw_only=True):
+    """Data section of the user saved CloudEvent"""
+    customer_name: str
+    user_name: str
+    user_email: str
+    user_role: str
+    email_template: str = "welcome"
+
+
+class UserSavedEvent(msgspec.Struct, kw_only=True):
+    """CloudEvent 1.0 envelope published when a user is saved"""
+    specversion: str = "1.0"
+    type: str = "disco.knapscen.user.saved"
+    source: str = "knapscen.disco"
+    subject: str
+    id: str
+    # Pre-formatted with isoformat() so the wire format stays "+00:00", not "Z"
+    time: str
+    datacontenttype: str = "application/json"
+    data: UserSavedData
+
+
 class UserRegistrationError(Exception):
     """Custom exception for user registration errors"""
     pass
@@ -98,7 +168,7 @@ class UserRegistrationError(Exception):
 
 def get_env_var(name: str, required: bool = True, default: str = None) -> Optional[str]:
     """Get environment variable with validation"""
-    value = os.getenv(name, default)
+    value = _ENV.get(name, default)
     if required and not value:
         raise UserRegistrationError(f"Required environment variable {name} is not set")
     return value
@@ -126,42 +196,84 @@ def get_nats_config() -> NATSConfig:
     )
 
 
-def lookup_customer_id(connection, customer_name: str) -> str:
-    """Lookup customer ID by name"""
-    with connection.cursor() as cursor:
-        cursor.execute(
-            "SELECT id FROM corporate_customers WHERE name = %s",
-            (customer_name,)
-        )
-        result = cursor.fetchone()
-        if not result:
-            raise UserRegistrationError(f"Customer '{customer_name}' not found")
-        return result[0]
-
-
-def lookup_role_id(connection, role_name: str) -> str:
-    """Lookup role ID by name"""
-    with connection.cursor() as cursor:
-        cursor.execute(
-            "SELECT id FROM user_roles WHERE role_name = %s",
-            (role_name,)
-        )
-        result = cursor.fetchone()
-        if not result:
-            raise UserRegistrationError(f"Role '{role_name}' not found")
-        return result[0]
+async def get_db_connection(db_config: DatabaseConfig):
+    """Open a database connection"""
+    return await aiomysql.connect(
+        host=db_config.host,
+        port=db_config.port,
+        user=db_config.user,
+        password=db_config.password,
+        db=db_config.database,
+        charset='utf8mb4'
+    )
+
+
+async def close_db_connection(connection):
+    """Close a database connection cleanly"""
+    # ensure_closed sends COM_QUIT so the server doesn't count an aborted client
+    await connection.ensure_closed()
+
+
+def name_key(name: str) -> str:
+    """Normalize a customer or role name for the lookup caches"""
+    return name.casefold()
 
 
-def get_user_info(connection) -> UserInfo:
-    """Extract and validate user information from environment variables"""
+async def prefetch_ids(connection, customer_names: Iterable[str], role_names: Iterable[str]):
+    """Resolve uncached customer and role names to IDs in a single round-trip
+    
+    Uses one IN (...) lookup per table, so each table is read once no matter
+    how many names are requested.
+    """
+    # One name per cache key, so case variants aren't sent twice
+    customer_names = {name_key(n): n for n in customer_names if n and name_key(n) not in _customer_id_cache}
+    role_names = {name_key(n): n for n in role_names if n and name_key(n) not in _role_id_cache}
+    
+    queries = []
+    params = []
+    for query, names in ((LOOKUP_CUSTOMER_QUERY, customer_names), (LOOKUP_ROLE_QUERY, role_names)):
+        if names:
+            queries.append(query.format(", ".join(["%s"] * len(names))))
+            params.extend(names.values())
+    if not queries:
+        return
+    
+    async with connection.cursor() as cursor:
+        await cursor.execute(" UNION ALL ".join(queries), params)
+        for kind, name, id_ in await cursor.fetchall():
+            cache = _customer_id_cache if kind == 'c' else _role_id_cache
+            cache.setdefault(name_key(name), id_)
+
+
+async def lookup_ids(connection, customer_name: Optional[str], role_name: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Lookup customer ID and/or role ID by name, querying only names not already cached"""
+    await prefetch_ids(connection, [customer_name], [role_name])
+    
+    customer_id = _customer_id_cache.get(name_key(customer_name)) if customer_name else None
+    role_id = _role_id_cache.get(name_key(role_name)) if role_name else None
+    
+    if customer_name and not customer_id:
+        raise UserRegistrationError(f"Customer '{customer_name}' not found")
+    if role_name and not role_id:
+        raise UserRegistrationError(f"Role '{role_name}' not found")
+    return customer_id, role_id
+
+
+def get_user_info() -> Tuple[UserInfo, Optional[str], Optional[str]]:
+    """Extract and validate user information from environment variables
+    
+    Returns a tentative UserInfo along with the customer and role names that
+    still need to be resolved to IDs (None when the ID was supplied directly).
+    """
     name = get_env_var('USER_NAME')
     email = get_env_var('USER_EMAIL')
     
-    # Get customer ID via lookup from customer name
-    customer_name = get_env_var('CUSTOMER_NAME')
-    if not customer_name:
-        raise UserRegistrationError("CUSTOMER_NAME must be provided")
-    customer_id = lookup_customer_id(connection, customer_name)
+    # Get customer ID (either directly or via lookup)
+    customer_id = get_env_var('CUSTOMER_ID', required=False)
+    customer_name = get_env_var('CUSTOMER_NAME', required=False)
+    
+    if not customer_id and not customer_name:
+        raise UserRegistrationError("Either CUSTOMER_ID or CUSTOMER_NAME must be provided")
     
     # Get role ID (either directly or via lookup)
     role_id = get_env_var('ROLE_ID', required=False)
@@ -170,113 +282,236 @@ def get_user_info(connection) -> UserInfo:
     if not role_id and not role_name:
         raise UserRegistrationError("Either ROLE_ID or ROLE_NAME must be provided")
     
-    if role_name and not role_id:
-        role_id = lookup_role_id(connection, role_name)
+    # The event payload only carries names, never IDs
+    if not customer_name:
+        logger.warning("CUSTOMER_NAME is not set; the event's customer_name will be empty")
+    if not role_name:
+        logger.warning("ROLE_NAME is not set; the event's user_role will be empty")
     
-    return UserInfo(
+    user_info = UserInfo(
         name=name,
         email=email,
         customer_id=customer_id,
         role_id=role_id
     )
+    return (
+        user_info,
+        customer_name if not customer_id else None,
+        role_name if not role_id else None
+    )
+
+
+async def resolve_user_info(connection, user_info: UserInfo, customer_name: Optional[str], role_name: Optional[str]) -> UserInfo:
+    """Fill in customer and role IDs by name, touching the database only if needed"""
+    if not customer_name and not role_name:
+        return user_info
+    
+    # Resolve any missing IDs with one combined query
+    customer_id, role_id = await lookup_ids(connection, customer_name, role_name)
+    return user_info._replace(
+        customer_id=customer_id or user_info.customer_id,
+        role_id=role_id or user_info.role_id
+    )
+
+
+@lru_cache(maxsize=8)
+def insert_users_query(rows: int) -> str:
+    """Build (once per row count) a multi-row INSERT statement for the users table"""
+    return INSERT_USER_QUERY + ", ".join([INSERT_USER_ROW] * rows)
 
 
-def insert_user(connection, user_info: UserInfo) -> str:
+async def insert_user(connection, user_info: UserInfo) -> str:
     """Insert user into database and return the generated user ID"""
     try:
-        with connection.cursor() as cursor:
-            # Insert the user (ID will be auto-generated)
-            insert_query = """
-                INSERT INTO users (customer_id, role_id, name, email)
-                VALUES (%s, %s, %s, %s)
-            """
-            cursor.execute(insert_query, (
-                user_info.customer_id,
-                user_info.role_id,
-                user_info.name,
-                user_info.email
-            ))
+        # MySQL has no INSERT ... RETURNING, so generate the UUID here and
+        # bind it explicitly instead of reading it back after the insert
+        user_id = str(uuid.uuid4())
+        async with connection.cursor() as cursor:
+            await cursor.execute(insert_users_query(1), (user_id, *user_info))
             
-            # Get the generated user ID
-            cursor.execute("SELECT LAST_INSERT_ID()")
-            # For UUID primary keys, we need to get the actual UUID
-            cursor.execute(
-                "SELECT id FROM users WHERE email = %s ORDER BY created_at DESC LIMIT 1",
-                (user_info.email,)
-            )
-            result = cursor.fetchone()
-            user_id = result[0]
-            
-            connection.commit()
-            logger.info(f"Successfully inserted user {user_info.name} with ID {user_id}")
+            await connection.commit()
+            logger.info("Successfully inserted user %s with ID %s", user_info.name, user_id)
             return user_id
             
-    except pymysql.IntegrityError as e:
+    except aiomysql.IntegrityError as e:
+        await connection.rollback()
         if "Duplicate entry" in str(e) and "email" in str(e):
             raise UserRegistrationError(f"User with email {user_info.email} already exists")
         raise UserRegistrationError(f"Database integrity error: {e}")
     except Exception as e:
-        connection.rollback()
+        await connection.rollback()
         raise UserRegistrationError(f"Failed to insert user: {e}")
 
 
-def prepare_event_data() -> Dict[str, Any]:
-    """Prepare event data from environment variables, excluding DB and NATS config"""
-    # Include user-related environment variables
-    event_data = {}
+def read_users_file(path: str) -> List[Dict[str, str]]:
+    """Read and validate bulk user records, one JSON object per line
     
-    user_vars = [
-        'USER_NAME', 'USER_EMAIL', 'CUSTOMER_NAME', 
-        'ROLE_ID', 'ROLE_NAME'
-    ]
+    Each record uses the lowercase names of the single-user variables
+    (user_name, user_email, customer_id/customer_name, role_id/role_name).
+    """
+    records = []
+    try:
+        with open(path, encoding='utf-8') as users_file:
+            for line_no, line in enumerate(users_file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = msgspec.json.decode(line, type=Dict[str, str])
+                except msgspec.DecodeError as e:
+                    raise UserRegistrationError(f"{path}:{line_no}: invalid user record: {e}")
+                
+                for field in ('user_name', 'user_email'):
+                    if not record.get(field):
+                        raise UserRegistrationError(f"{path}:{line_no}: {field} must be provided")
+                if not record.get('customer_id') and not record.get('customer_name'):
+                    raise UserRegistrationError(f"{path}:{line_no}: either customer_id or customer_name must be provided")
+                if not record.get('role_id') and not record.get('role_name'):
+                    raise UserRegistrationError(f"{path}:{line_no}: either role_id or role_name must be provided")
+                records.append(record)
+    except OSError as e:
+        raise UserRegistrationError(f"Failed to read users file: {e}")
+    
+    if not records:
+        raise UserRegistrationError(f"No user records found in {path}")
+    return records
+
+
+async def resolve_bulk_users(connection, records: List[Dict[str, str]]) -> List[UserInfo]:
+    """Turn bulk user records into UserInfo rows, resolving all names in one query"""
+    await prefetch_ids(
+        connection,
+        (r['customer_name'] for r in records if not r.get('customer_id')),
+        (r['role_name'] for r in records if not r.get('role_id'))
+    )
     
-    for var in user_vars:
-        value = os.getenv(var)
-        if value:
-            event_data[var.lower()] = value
+    users = []
+    for record in records:
+        customer_id = record.get('customer_id') or _customer_id_cache.get(name_key(record['customer_name']))
+        if not customer_id:
+            raise UserRegistrationError(f"Customer '{record['customer_name']}' not found")
+        role_id = record.get('role_id') or _role_id_cache.get(name_key(record['role_name']))
+        if not role_id:
+            raise UserRegistrationError(f"Role '{record['role_name']}' not found")
         
+        users.append(UserInfo(
+            name=record['user_name'],
+            email=record['user_email'],
+            customer_id=customer_id,
+            role_id=role_id
+        ))
+    return users
+
+
+async def register_users_bulk(connection, users: List[UserInfo]) -> List[str]:
+    """Insert many users with multi-row INSERTs in one transaction and return their IDs"""
+    user_ids = [str(uuid.uuid4()) for _ in users]
+    try:
+        async with connection.cursor() as cursor:
+            for start in range(0, len(users), BULK_INSERT_CHUNK_SIZE):
+                chunk = users[start:start + BULK_INSERT_CHUNK_SIZE]
+                chunk_ids = user_ids[start:start + BULK_INSERT_CHUNK_SIZE]
+                
+                insert_query = insert_users_query(len(chunk))
+                params = []
+                for user_id, user_info in zip(chunk_ids, chunk):
+                    params.append(user_id)
+                    params.extend(user_info)
+                await cursor.execute(insert_query, params)
+            
+            await connection.commit()
+            logger.info("Successfully inserted %d users", len(users))
+            return user_ids
+            
+    except aiomysql.IntegrityError as e:
+        await connection.rollback()
+        if "Duplicate entry" in str(e) and "email" in str(e):
+            raise UserRegistrationError(f"Duplicate email in bulk registration: {e}")
+        raise UserRegistrationError(f"Database integrity error: {e}")
+    except Exception as e:
+        await connection.rollback()
+        raise UserRegistrationError(f"Failed to insert users: {e}")
+
+
+async def register_user_in_db(db_config: DatabaseConfig, user_info: UserInfo, customer_name: Optional[str], role_name: Optional[str]) -> str:
+    """Connect, resolve any customer/role names, insert the user and return its ID"""
+    logger.info("Connecting to database...")
+    connection = await get_db_connection(db_config)
+    try:
+        # Resolve customer/role names to IDs, if any were given
+        user_info = await resolve_user_info(connection, user_info, customer_name, role_name)
+        
+        # Insert user into database
+        logger.info("Registering user in database...")
+        return await insert_user(connection, user_info)
+    finally:
+        await close_db_connection(connection)
+
+
+async def register_users_in_db(db_config: DatabaseConfig, records: List[Dict[str, str]]) -> List[str]:
+    """Connect, resolve names for all bulk records, insert them and return their IDs"""
+    logger.info("Connecting to database...")
+    connection = await get_db_connection(db_config)
+    try:
+        users = await resolve_bulk_users(connection, records)
+        
+        logger.info("Registering %d users in database...", len(users))
+        return await register_users_bulk(connection, users)
+    finally:
+        await close_db_connection(connection)
+
+
+def prepare_event_data() -> Dict[str, Any]:
+    """Prepare event data from environment variables, excluding DB and NATS config"""
+    event_data = {key: value for var, key in _USER_VARS_LOWER if (value := _ENV.get(var))}
     return event_data
 
 
-def create_cloudevent_payload(user_id: str, event_data: Dict[str, Any]) -> Dict[str, Any]:
+def create_cloudevent_payload(user_id: str, event_data: Dict[str, Any]) -> UserSavedEvent:
     """Create a CloudEvent-compliant payload"""
-    # Get current timestamp in ISO 8601 format
-    current_time = datetime.now(timezone.utc).isoformat()
-    
-    # Generate a unique event ID
-    event_id = str(uuid.uuid4())[:8]
-    
-    # Create CloudEvent-compliant payload
-    cloudevent_payload = {
-        "specversion": "1.0",
-        "type": "disco.knapscen.user.saved",
-        "source": "knapscen.disco",
-        "subject": f"user-{user_id}",
-        "id": event_id,
-        "time": current_time,
-        "datacontenttype": "application/json",
-        "data": {
-            "customer_name": event_data.get('customer_name', ''),
-            "user_name": event_data.get('user_name', ''),
-            "user_email": event_data.get('user_email', ''),
-            "user_role": event_data.get('role_name', ''),
-            "email_template": "welcome"
-        }
-    }
-    
-    return cloudevent_payload
+    return UserSavedEvent(
+        subject=f"user-{user_id}",
+        # Generate a unique event ID
+        id=uuid.uuid4().hex[:8],
+        time=datetime.now(timezone.utc).isoformat(),
+        data=UserSavedData(
+            customer_name=event_data.get('customer_name', ''),
+            user_name=event_data.get('user_name', ''),
+            user_email=event_data.get('user_email', ''),
+            user_role=event_data.get('role_name', '')
+        )
+    )
 
 
-async def publish_event(nats_config: NATSConfig, event_data: Dict[str, Any], user_id: str):
-    """Publish user registration event to NATS JetStream"""
-    try:
+async def get_jetstream(nats_config: NATSConfig) -> JetStreamContext:
+    """Return the shared JetStream context, connecting to NATS on first use"""
+    global _nc, _js
+    if _js is None:
         # Connect to NATS with optional authentication
         connect_options = {"servers": [nats_config.server]}
         connect_options["user"] = nats_config.user
         connect_options["password"] = nats_config.password
-            
-        nc = await nats.connect(**connect_options)
-        js = nc.jetstream()
+        
+        try:
+            _nc = await nats.connect(**connect_options)
+        except Exception as e:
+            raise UserRegistrationError(f"Failed to connect to NATS: {e}")
+        _js = _nc.jetstream()
+    return _js
+
+
+async def close_nats():
+    """Close the shared NATS connection, if one was opened"""
+    global _nc, _js
+    if _nc is not None:
+        await _nc.close()
+    _nc = None
+    _js = None
+
+
+async def publish_event(nats_config: NATSConfig, event_data: Dict[str, Any], user_id: str):
+    """Publish user registration event to NATS JetStream"""
+    try:
+        js = await get_jetstream(nats_config)
         
         # Create CloudEvent-compliant payload
         event_payload = create_cloudevent_payload(user_id, event_data)
@@ -284,18 +519,57 @@ async def publish_event(nats_config: NATSConfig, event_data: Dict[str, Any], use
         # Publish to JetStream
         await js.publish(
             subject=nats_config.subject,
-            payload=json.dumps(event_payload).encode('utf-8')
+            payload=_event_encoder.encode(event_payload)
         )
         
-        logger.info(f"Successfully published CloudEvent to {nats_config.subject}")
-        
-        # Close connection
-        await nc.close()
+        logger.info("Successfully published CloudEvent to %s", nats_config.subject)
         
     except Exception as e:
         raise UserRegistrationError(f"Failed to publish NATS event: {e}")
 
 
+async def publish_events(nats_config: NATSConfig, events: List[Tuple[str, Dict[str, Any]]]):
+    """Publish many user registration events, pipelining up to PUBLISH_CONCURRENCY acks
+    
+    Every publish is allowed to finish; if any fail, only the user IDs whose
+    events were not acked are logged for replay.
+    """
+    try:
+        js = await get_jetstream(nats_config)
+    except Exception as e:
+        raise UserRegistrationError(f"Failed to publish NATS events: {e}")
+    semaphore = asyncio.Semaphore(PUBLISH_CONCURRENCY)
+    
+    async def publish_one(user_id: str, event_data: Dict[str, Any]):
+        async with semaphore:
+            await js.publish(
+                subject=nats_config.subject,
+                payload=_event_encoder.encode(create_cloudevent_payload(user_id, event_data))
+            )
+    
+    results = await asyncio.gather(
+        *(publish_one(user_id, event_data) for user_id, event_data in events),
+        return_exceptions=True
+    )
+    
+    failed = [
+        (user_id, result)
+        for (user_id, _), result in zip(events, results)
+        if isinstance(result, BaseException)
+    ]
+    if failed:
+        failed_ids = [user_id for user_id, _ in failed]
+        logger.error(
+            "%d of %d events were not published; replay events for user IDs: %s",
+            len(failed), len(events), ", ".join(failed_ids)
+        )
+        raise UserRegistrationError(
+            f"Failed to publish {len(failed)} of {len(events)} NATS events: {failed[0][1]}"
+        )
+    
+    logger.info("Successfully published %d CloudEvents to %s", len(events), nats_config.subject)
+
+
 async def main():
     """Main function"""
     try:
@@ -305,46 +579,73 @@ async def main():
         db_config = get_database_config()
         nats_config = get_nats_config()
         
-        # Connect to database
-        logger.info("Connecting to database...")
-        connection = pymysql.connect(
-            host=db_config.host,
-            port=db_config.port,
-            user=db_config.user,
-            password=db_config.password,
-            database=db_config.database,
-            charset='utf8mb4'
-        )
+        # Validate user information before opening any connections
+        users_file = get_env_var('USERS_FILE', required=False)
+        if users_file:
+            logger.info("Reading users from %s...", users_file)
+            records = read_users_file(users_file)
+        else:
+            logger.info("Extracting user information...")
+            user_info, customer_name, role_name = get_user_info()
+        
+        # Start the NATS handshake so it overlaps with the database work
+        nats_task = asyncio.create_task(get_jetstream(nats_config))
         
         try:
-            # Get user information
-            logger.info("Extracting user information...")
-            user_info = get_user_info(connection)
+            if users_file:
+                user_ids = await register_users_in_db(db_config, records)
+                
+                # Each record already holds the event data for its user
+                try:
+                    await nats_task
+                except UserRegistrationError:
+                    # Nothing was published, so every saved user needs a replay
+                    logger.error(
+                        "%d users were saved but no events were published; "
+                        "replay events for user IDs: %s",
+                        len(user_ids), ", ".join(user_ids)
+                    )
+                    raise
+                
+                # publish_events logs only the IDs whose events failed
+                logger.info("Publishing events to NATS JetStream...")
+                await publish_events(nats_config, list(zip(user_ids, records)))
+                
+                logger.info("Bulk user registration completed successfully!")
+                print(f"Registered {len(user_ids)} users successfully")
+                return
             
-            # Insert user into database
-            logger.info("Registering user in database...")
-            user_id = insert_user(connection, user_info)
+            user_id = await register_user_in_db(db_config, user_info, customer_name, role_name)
             
             # Prepare event data
             logger.info("Preparing event data...")
             event_data = prepare_event_data()
             
-            # Publish event to NATS
-            logger.info("Publishing event to NATS JetStream...")
-            await publish_event(nats_config, event_data, user_id)
+            # Publish event to NATS once the connection is ready
+            try:
+                await nats_task
+                logger.info("Publishing event to NATS JetStream...")
+                await publish_event(nats_config, event_data, user_id)
+            except UserRegistrationError:
+                # The row is already committed, so make the ID easy to replay
+                logger.error("User %s was saved but its event was not published", user_id)
+                raise
             
             logger.info("User registration completed successfully!")
             print(f"User registered successfully with ID: {user_id}")
             
         finally:
-            connection.close()
+            # Cancel the handshake if the database work failed first
+            nats_task.cancel()
+            await asyncio.gather(nats_task, return_exceptions=True)
+            await close_nats()
             
     except UserRegistrationError as e:
-        logger.error(f"Registration error: {e}")
+        logger.error("Registration error: %s", e)
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
     except Exception as e:
-        logger.error(f"Unexpected error: {e}")
+        logger.error("Unexpected error: %s", e)
         print(f"Unexpected error: {e}", file=sys.stderr)
         sys.exit(1)
 
@@ -146,6 +146,27 @@ test_scenario_4() {
     python3 register_user.py
 }
 
+# Test scenario 5: Register several users in bulk from a file
+test_scenario_5() {
+    print_info "Running Test Scenario 5: Bulk user registration from USERS_FILE"
+    
+    local users_file
+    users_file=$(mktemp)
+    cat > "${users_file}" <<EOF
+{"user_name": "Carol White", "user_email": "carol.white.test5@techcorp.com", "customer_name": "TechCorp Solutions", "role_name": "admin_user"}
+{"user_name": "Dan Green", "user_email": "dan.green.test5@techcorp.com", "customer_name": "TechCorp Solutions", "role_name": "generic_user"}
+{"user_name": "Eve Black", "user_email": "eve.black.test5@innovationlabs.com", "customer_name": "Innovation Labs", "role_name": "generic_user"}
+EOF
+    export USERS_FILE="${users_file}"
+    
+    print_info "Users file: ${USERS_FILE}"
+    
+    python3 register_user.py
+    
+    unset USERS_FILE
+    rm -f "${users_file}"
+}
+
 # Function to run a specific scenario
 run_scenario() {
     local scenario=$1
@@ -164,6 +185,9 @@ run_scenario() {
         4)
             test_scenario_4
             ;;
+        5)
+            test_scenario_5
+            ;;
         *)
             print_error "Unknown scenario: $scenario"
             exit 1
@@ -181,6 +205,7 @@ show_usage() {
     echo "  2 - Register user with direct UUIDs (requires real database IDs)"
     echo "  3 - Register admin user"
     echo "  4 - Register generic user"
+    echo "  5 - Register several users in bulk from a file"
     echo "  all - Run all applicable scenarios (skips scenario 2)"
     echo
     echo "Examples:"
@@ -220,7 +245,7 @@ main() {
     fi
     
     case $1 in
-        1|2|3|4)
+        1|2|3|4|5)
             run_scenario $1
             print_success "Scenario $1 completed successfully!"
             ;;
@@ -233,6 +258,9 @@ main() {
             print_info "Pausing between scenarios..."
             sleep 2
             run_scenario 4
+            print_info "Pausing between scenarios..."
+            sleep 2
+            run_scenario 5
             print_success "All scenarios completed successfully!"
             print_warning "Note: Scenario 2 was skipped (requires real database UUIDs)"
             ;;